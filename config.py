@@ -11,9 +11,20 @@ class Config:
     HF_MODEL_NAME = "mistralai/Mistral-7B-Instruct-v0.3"
     HF_API_URL = f"https://api-inference.huggingface.co/models/{HF_MODEL_NAME}"
     
+    # Request headers, built once so API clients don't re-format them
+    HF_HEADERS = {
+        "Authorization": f"Bearer {HF_API_KEY}",
+        "Content-Type": "application/json"
+    }
+    
     # Additional configuration settings can go here
     MAX_LENGTH = 2048
     TEMPERATURE = 0.7
+    # Upper bound on concurrent requests to the Inference API across the whole process
+    MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "8"))
+
+    # Number of recent conversation turns kept in session memory
+    MEMORY_WINDOW = 20
 
     # Metrics
     METRICS = [
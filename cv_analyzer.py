@@ -1,18 +1,90 @@
+import os
 import pandas as pd
-import json
-from typing import Tuple, Any
+import orjson
+import functools
+from pathlib import Path
+from types import MappingProxyType
+from typing import Callable, Dict, Tuple, Mapping
 from datetime import datetime, timedelta
 import numpy as np
 
+@functools.lru_cache(maxsize=None)
+def _load_json(path: str) -> Mapping:
+    """Load a JSON asset once per process and expose it read-only"""
+    return MappingProxyType(orjson.loads(Path(path).read_bytes()))
+
+# Shared generator; set SEED in the environment for reproducible output
+_SEED = os.getenv("SEED")
+_RNG = np.random.default_rng(int(_SEED) if _SEED else None)
+
+# (low, high) bounds for uniformly sampled metrics
+METRIC_RANGES = {
+    "NDVI": (0.3, 0.8),  # NDVI typically ranges from -1 to 1
+    "NDMI": (-0.2, 0.4),  # NDMI typically ranges from -1 to 1
+    "SAVI": (0.2, 0.7),  # SAVI typically ranges from -1 to 1
+    "EVI": (0.1, 0.6),  # EVI typically ranges from -1 to 1
+    "GNDVI": (0.4, 0.9),  # GNDVI typically ranges from -1 to 1
+    "Canopy Cover": (60, 95),  # Percentage
+}
+FIELD_AREA_HECTARES = 100.0
+
+# Samplers for metrics that don't follow a uniform range, keyed by metric name
+METRIC_SAMPLERS: Dict[str, Callable[[int], np.ndarray]] = {
+    # Constant field area with small random variations
+    "Field_Area": lambda n: FIELD_AREA_HECTARES + _RNG.standard_normal(n) * 0.1,
+}
+DEFAULT_DAYS = 30
+
+@functools.lru_cache(maxsize=16)
+def _parse_date_range_days(date_range: str) -> int:
+    """Return the number of days covered by a "last N days" style range"""
+    normalized = str(date_range).lower()
+    if "last" in normalized:
+        try:
+            return int(normalized.split()[1])
+        except (IndexError, ValueError):
+            pass
+    return DEFAULT_DAYS
+
+def _read_only(arr: np.ndarray) -> np.ndarray:
+    """Mark a cached array read-only so callers can't mutate the shared copy"""
+    arr.setflags(write=False)
+    return arr
+
+@functools.lru_cache(maxsize=32)
+def _trend_and_seasonality(n: int) -> np.ndarray:
+    """Slight upward trend plus seasonality added to every metric series of length n"""
+    return _read_only(np.linspace(0, 0.1, n) + 0.05 * np.sin(np.linspace(0, 4*np.pi, n)))
+
+@functools.lru_cache(maxsize=32)
+def _variation_shape(n: int) -> np.ndarray:
+    """Unit curve of 1 + trend + seasonality, scaled by the base value in variations"""
+    return _read_only(
+        1 + np.linspace(-0.02, 0.02, n) + 0.1 * np.sin(np.linspace(0, 2*np.pi, n))
+    )
+
+@functools.lru_cache(maxsize=64)
+def _date_range(start_ordinal: int, end_ordinal: int, freq: str) -> pd.DatetimeIndex:
+    """Return the day-aligned index between two date ordinals, built once per range"""
+    return pd.date_range(
+        pd.Timestamp.fromordinal(start_ordinal),
+        pd.Timestamp.fromordinal(end_ordinal),
+        freq=freq
+    )
+
 class HardcodedCVAnalyzer:
     """Provides CV analysis results in DataFrame format"""
     
     def __init__(self):
         # Load the visualization data
-        self.visualization_data = json.load(open("assets/metrics.json", encoding="utf-8"))
+        self.visualization_data = _load_json("assets/metrics.json")
         self.image_output = "assets/histogram.jpeg"
         
     async def analyze(self, location: str, date_range: str, metrics: list) -> Tuple[pd.DataFrame, str]:
+        """Generate analysis results as a DataFrame, see analyze_sync"""
+        return self.analyze_sync(location, date_range, metrics)
+
+    def analyze_sync(self, location: str, date_range: str, metrics: list) -> Tuple[pd.DataFrame, str]:
         """
         Generate analysis results as a DataFrame
         
@@ -26,71 +98,48 @@ class HardcodedCVAnalyzer:
         """
         # Parse date range
         end_date = datetime.now()
-        if "last" in date_range.lower():
-            try:
-                days = int(date_range.lower().split()[1])
-                start_date = end_date - timedelta(days=days)
-            except:
-                start_date = end_date - timedelta(days=30)  # Default to 30 days
-        else:
-            start_date = end_date - timedelta(days=30)  # Default to 30 days
+        start_date = end_date - timedelta(days=_parse_date_range_days(date_range))
             
         # Generate date range
-        dates = pd.date_range(start=start_date, end=end_date, freq='D')
+        # DatetimeIndex is immutable, so the cached index can be shared
+        dates = _date_range(start_date.toordinal(), end_date.toordinal(), 'D')
+        n = len(dates)
+        
+        # Unknown and repeated metrics are skipped, as before
+        metrics = [m for m in dict.fromkeys(metrics) if m in METRIC_RANGES or m in METRIC_SAMPLERS]
+        
+        # Draw every requested metric in one call, then scale each row to its range
+        bounds = np.array([METRIC_RANGES.get(m, (0.0, 0.0)) for m in metrics], dtype=float).reshape(-1, 2)
+        lows, highs = bounds[:, :1], bounds[:, 1:]
+        values = _RNG.random((len(metrics), n))
+        values *= highs - lows
+        values += lows
         
-        # Create base DataFrame with dates
-        df = pd.DataFrame({'date': dates})
+        for idx, metric in enumerate(metrics):
+            if (sampler := METRIC_SAMPLERS.get(metric)) is not None:
+                values[idx] = sampler(n)
         
-        # Generate data for each requested metric
-        for metric in metrics:
-            if metric == "NDVI":
-                df[metric] = np.random.uniform(0.3, 0.8, len(dates))  # NDVI typically ranges from -1 to 1
-            elif metric == "NDMI":
-                df[metric] = np.random.uniform(-0.2, 0.4, len(dates))  # NDMI typically ranges from -1 to 1
-            elif metric == "SAVI":
-                df[metric] = np.random.uniform(0.2, 0.7, len(dates))  # SAVI typically ranges from -1 to 1
-            elif metric == "EVI":
-                df[metric] = np.random.uniform(0.1, 0.6, len(dates))  # EVI typically ranges from -1 to 1
-            elif metric == "GNDVI":
-                df[metric] = np.random.uniform(0.4, 0.9, len(dates))  # GNDVI typically ranges from -1 to 1
-            elif metric == "Field_Area":
-                # Constant field area with small random variations
-                base_area = 100.0  # hectares
-                df[metric] = base_area + np.random.normal(0, 0.1, len(dates))
-            elif metric == "Canopy Cover":
-                df[metric] = np.random.uniform(60, 95, len(dates))  # Percentage
-                
-        # Add some trends and patterns
-        for col in df.columns:
-            if col != 'date':
-                # Add slight upward trend
-                trend = np.linspace(0, 0.1, len(df)) 
-                df[col] = df[col] + trend
-                
-                # Add some seasonality
-                seasonality = 0.05 * np.sin(np.linspace(0, 4*np.pi, len(df)))
-                df[col] = df[col] + seasonality
-                
-                # Ensure values stay within reasonable ranges
-                df[col] = df[col].clip(lower=0)
-                
-                # Add some random noise
-                df[col] = df[col] + np.random.normal(0, 0.02, len(df))
+        # Add slight upward trend and some seasonality (shared by every metric)
+        values += _trend_and_seasonality(n)
         
-        # Sort by date
-        df = df.sort_values('date')
+        # Ensure values stay within reasonable ranges
+        np.clip(values, 0, None, out=values)
+        
+        # Add some random noise
+        values += _RNG.standard_normal(values.shape) * 0.02
+        
+        # Dates are generated in ascending order, so no sort is needed.
+        # values.T is a view whose transpose matches pandas' block layout,
+        # so the frame wraps the array without another copy
+        df = pd.DataFrame(values.T, columns=metrics, copy=False)
+        df.insert(0, 'date', dates)
         
         return df, self.image_output
 
     def _generate_realistic_variations(self, base_value: float, num_points: int) -> np.ndarray:
         """Generate realistic variations around a base value"""
         # Add small random variations
-        variations = np.random.normal(0, 0.05 * base_value, num_points)
-        
-        # Add slight trend
-        trend = np.linspace(-0.02 * base_value, 0.02 * base_value, num_points)
-        
-        # Add seasonality
-        seasonality = 0.1 * base_value * np.sin(np.linspace(0, 2*np.pi, num_points))
+        variations = _RNG.standard_normal(num_points) * (0.05 * base_value)
         
-        return base_value + variations + trend + seasonality
\ No newline at end of file
+        # Add slight trend and seasonality, both proportional to the base value
+        return base_value * _variation_shape(num_points) + variations
@@ -1,9 +1,16 @@
-from typing import List, Dict, Optional, Union
+from typing import AsyncIterator, Callable, List, Dict, Optional, Union
 from dataclasses import dataclass
-import json
+import asyncio
+import contextlib
+import hashlib
+import re
+import threading
+import weakref
 import httpx
+import orjson
 import logging
 import pandas as pd
+from cachetools import LRUCache
 
 
 from llme_instructions import llm_engine_instructions, base_system_prompt
@@ -13,17 +20,106 @@ from config import Config
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Llama chat templates, keyed by role
+_CHAT_TEMPLATES = {
+    "system": "<s>[INST] <<SYS>>\n{}\n<</SYS>>\n\n",
+    "user_first": "[INST] {} [/INST] ",
+    "user": "{} [/INST] ",
+    "assistant": "{} </s><s>[INST] "
+}
+
+# Mistral instruct templates used for API requests, keyed by role
+_MISTRAL_TEMPLATES = {
+    "system": "[INST] <>\n{}\n<>\n\n",
+    "user": "{} [/INST]",
+    "assistant": " {} [INST]"
+}
+_SPECIAL_TOKEN_RE = re.compile(r"</?s>")
+_SYS_MARKER_RE = re.compile(r"<</?SYS>>")
+_SPECIAL_MARKERS = ("[INST]", "<<SYS>>", "<</SYS>>", "</s>", "<s>")
+
+# Phrases in a response that signal the LLM wants more data
+_NEEDS_MORE_RE = re.compile(
+    r"need more data|additional information required|insufficient data|historical data would be helpful",
+    re.IGNORECASE
+)
+_HISTORICAL_RE = re.compile(r"historical", re.IGNORECASE)
+
+_LOCATION_FOLLOW_UP = "Would you like to see a detailed analysis of specific areas in {}?"
+_STATIC_FOLLOW_UPS = (
+    "Should we analyze any other metrics for this field?",
+    "Would you like to compare this with historical data?"
+)
+
+# Connection pool per event loop, so keep-alive connections are reused
+# instead of paying a new TCP + TLS handshake per call. Connections are
+# bound to the loop that opened them, and a loop that stays alive across
+# requests keeps its pool warm
+_HTTP_CLIENTS: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+def _get_http_client() -> httpx.AsyncClient:
+    """Return the AsyncClient for the running event loop, creating it if needed"""
+    loop = asyncio.get_running_loop()
+    client = _HTTP_CLIENTS.get(loop)
+    if client is None or client.is_closed:
+        client = _HTTP_CLIENTS[loop] = httpx.AsyncClient(
+            http2=True,
+            timeout=httpx.Timeout(30.0, connect=5.0),
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=32)
+        )
+    return client
+
+# Process-wide cap on concurrent API requests. Sessions run on separate event loops,
+# so this is a thread semaphore; waiters poll it instead of blocking their loop
+_REQUEST_SLOTS = threading.BoundedSemaphore(Config.MAX_CONCURRENT_REQUESTS)
+_REQUEST_SLOT_POLL_INTERVAL = 0.05
+
+@contextlib.asynccontextmanager
+async def _request_slot():
+    """Hold one of the process-wide API request slots for the duration of a request"""
+    while not _REQUEST_SLOTS.acquire(blocking=False):
+        await asyncio.sleep(_REQUEST_SLOT_POLL_INTERVAL)
+    try:
+        yield
+    finally:
+        _REQUEST_SLOTS.release()
+
+async def aclose_http_client():
+    """Close the AsyncClient of the running event loop, call on shutdown"""
+    client = _HTTP_CLIENTS.pop(asyncio.get_running_loop(), None)
+    if client is not None and not client.is_closed:
+        await client.aclose()
+
 class WorkflowMonitor:
     """Monitor and log workflow stages"""
     
+    # Switch off to skip stage logging entirely, regardless of logger level
+    ENABLED = True
+    
     @staticmethod
-    def log_stage(stage_name: str, details: Optional[Dict] = None):
-        """Log workflow stage with optional details"""
-        message = f"[WORKFLOW STAGE] {stage_name}"
+    def log_stage(stage_name: str, details: Union[Dict, Callable[[], Dict], None] = None):
+        """Log workflow stage with optional details
+        
+        details may be a callable returning the dict, so costly details are
+        only built when the stage is actually logged.
+        """
+        if not WorkflowMonitor.ENABLED or not logger.isEnabledFor(logging.INFO):
+            return
+        
+        if callable(details):
+            details = details()
         if details:
-            message += f": {details}"
-        logger.info(message)
-        print(message)
+            logger.info("[WORKFLOW STAGE] %s: %s", stage_name, WorkflowMonitor._summarize(details))
+        else:
+            logger.info("[WORKFLOW STAGE] %s", stage_name)
+
+    @staticmethod
+    def _summarize(details: Dict) -> Dict:
+        """Replace DataFrames in details with their shape so they aren't fully rendered"""
+        return {
+            key: {"rows": len(value), "columns": list(value.columns)} if isinstance(value, pd.DataFrame) else value
+            for key, value in details.items()
+        }
 
 @dataclass
 class LLMResponse:
@@ -38,55 +134,91 @@ class APILLMEngine:
     """Logic for the LLM engine using Llama"""
     def __init__(self):
         self.api_url = Config.HF_API_URL
-        self.headers = {
-            "Authorization": f"Bearer {Config.HF_API_KEY}",
-            "Content-Type": "application/json"
+        self.headers = Config.HF_HEADERS
+        self.system_prompt = base_system_prompt()
+        # Generation settings are fixed, so build them once per engine
+        self.generation_parameters = {
+            "max_new_tokens": 512,
+            "temperature": Config.TEMPERATURE,
+            "top_p": 0.9,
+            "do_sample": True,
+            "return_full_text": False
         }
+        # Generated analyses keyed by a digest of the prompt, results and context
+        self.response_cache: LRUCache = LRUCache(maxsize=256)
+        # The engine is shared by every session thread and LRUCache isn't thread-safe
+        self._cache_lock = threading.Lock()
+
+    async def aclose(self):
+        """Release pooled HTTP connections, call on application shutdown"""
+        await aclose_http_client()
+
+    def _format_api_prompt(self, messages: Union[List[Dict[str, str]], Dict]) -> str:
+        """Format messages into a single Mistral instruct string"""
+        if isinstance(messages, dict):
+            messages = [messages]
+            
+        return "".join(
+            _MISTRAL_TEMPLATES[msg["role"]].format(msg["content"])
+            for msg in messages
+            if msg["role"] in _MISTRAL_TEMPLATES
+        )
+
+    def _cache_key(self, prompt: str, results: pd.DataFrame, context: Dict) -> Optional[bytes]:
+        """Digest of a prompt, the results it analyzes and their context, or None if the results are unhashable"""
+        try:
+            row_hashes = pd.util.hash_pandas_object(results, index=False).to_numpy()
+        except TypeError:
+            return None
+        digest = hashlib.blake2b(prompt.encode(), digest_size=16)
+        digest.update(repr(list(results.columns)).encode())
+        digest.update(row_hashes.tobytes())
+        digest.update(orjson.dumps(context, option=orjson.OPT_SORT_KEYS, default=str))
+        return digest.digest()
+
+    def _cached_response(self, cache_key: bytes) -> Optional[str]:
+        with self._cache_lock:
+            return self.response_cache.get(cache_key)
 
-    async def _make_api_request(self, messages: Union[List[Dict[str, str]], Dict]) -> str:
-        """Make API request to Hugging Face"""
+    def _store_response(self, cache_key: bytes, text: str):
+        with self._cache_lock:
+            self.response_cache[cache_key] = text
+
+    async def _make_api_request(self, messages: Union[List[Dict[str, str]], Dict], cache_key: Optional[bytes] = None) -> str:
+        """Make API request to Hugging Face, caching the generated text under cache_key if given"""
         try:
             # Format messages into a single string
-            if isinstance(messages, dict):
-                messages = [messages]
-                
-            # Convert messages to Mistral's expected format
-            prompt = ""
-            for msg in messages:
-                if msg["role"] == "system":
-                    prompt += f"[INST] <>\n{msg['content']}\n<>\n\n"
-                elif msg["role"] == "user":
-                    prompt += f"{msg['content']} [/INST]"
-                elif msg["role"] == "assistant":
-                    prompt += f" {msg['content']} [INST]"
+            prompt = self._format_api_prompt(messages)
+
+            # Repeat requests skip the round-trip entirely
+            if cache_key is not None and (cached := self._cached_response(cache_key)) is not None:
+                return cached
 
             payload = {
                 "inputs": prompt,  # Send a single string instead of a sequence
-                "parameters": {
-                    "max_new_tokens": 512,
-                    "temperature": Config.TEMPERATURE,
-                    "top_p": 0.9,
-                    "do_sample": True,
-                    "return_full_text": False
-                }
+                "parameters": self.generation_parameters
             }
 
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
+            # HTTP/2 multiplexes streams on one connection, so the pool limits don't cap this
+            async with _request_slot():
+                response = await _get_http_client().post(
                     self.api_url,
-                    json=payload,
-                    headers=self.headers,
-                    timeout=30.0
+                    content=orjson.dumps(payload),
+                    headers=self.headers
                 )
-                response.raise_for_status()
-                
-                # Extract the generated text
-                result = response.json()
-                if isinstance(result, list) and len(result) > 0:
-                    return result[0]["generated_text"]
-                else:
-                    logger.error(f"Unexpected response format: {result}")
-                    return "I apologize, but I encountered an issue processing your request. Could you please try again?"
+            response.raise_for_status()
+            
+            # Extract the generated text
+            result = orjson.loads(response.content)
+            if isinstance(result, list) and len(result) > 0:
+                # Only successful generations are cached, never the fallback messages
+                generated_text = result[0]["generated_text"]
+                if cache_key is not None:
+                    self._store_response(cache_key, generated_text)
+                return generated_text
+            else:
+                logger.error(f"Unexpected response format: {result}")
+                return "I apologize, but I encountered an issue processing your request. Could you please try again?"
                 
         except httpx.HTTPStatusError as e:
             logger.error(f"HTTP error occurred: {e.response.status_code} - {e.response.text}")
@@ -100,10 +232,60 @@ class APILLMEngine:
             logger.error(f"Error during API request: {str(e)}")
             return "I apologize, but I encountered an unexpected error. Please try again."
 
-    async def analyze_results(self, results: 'pd.DataFrame', context: Dict) -> 'LLMResponse':
-        """Analyze results using Llama"""
-        WorkflowMonitor.log_stage("LLM Analysis", {"context": str(context)})
+    async def astream_complete(self, messages: Union[List[Dict[str, str]], Dict], cache_key: Optional[bytes] = None) -> AsyncIterator[str]:
+        """Stream generated text from Hugging Face as it is produced
+        
+        Errors are raised to the caller rather than turned into a message,
+        since part of the text may already have been consumed. A reply read
+        to the end is cached under cache_key if given.
+        """
+        prompt = self._format_api_prompt(messages)
+        if cache_key is not None and (cached := self._cached_response(cache_key)) is not None:
+            yield cached
+            return
+        
+        payload = {
+            "inputs": prompt,
+            "parameters": self.generation_parameters,
+            "stream": True
+        }
         
+        chunks = []
+        finished = False
+        async with _request_slot(), _get_http_client().stream(
+            "POST",
+            self.api_url,
+            content=orjson.dumps(payload),
+            headers=self.headers
+        ) as response:
+            response.raise_for_status()
+            
+            # Server-sent events, one "data:{...}" line per generated token
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                event = orjson.loads(line[5:])
+                if "error" in event:
+                    raise RuntimeError(f"Streaming error from Hugging Face: {event['error']}")
+                # The last event carries the full generated_text
+                if event.get("generated_text") is not None:
+                    finished = True
+                token = event.get("token") or {}
+                if token.get("special") or not token.get("text"):
+                    continue
+                chunks.append(token["text"])
+                yield token["text"]
+        
+        # An empty reply is a failure, so callers can fall back instead of caching it
+        if not chunks:
+            raise RuntimeError("Stream ended without generating any text")
+        
+        # Only cache generations that were read to the final event
+        if cache_key is not None and finished:
+            self._store_response(cache_key, "".join(chunks))
+
+    def _analysis_messages(self) -> List[Dict[str, str]]:
+        """Build the chat messages for an analysis request"""
         # Format the prompt for Llama
         system_prompt = self._get_system_prompt()
         analysis_prompt = """
@@ -112,12 +294,13 @@ class APILLMEngine:
         2. Key recommendation (if needed)
         """
         
-        messages = [
+        return [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": analysis_prompt}
         ]
-        
-        response = await self._make_api_request(messages)
+
+    def build_analysis_response(self, response: str, context: Dict) -> 'LLMResponse':
+        """Turn the generated analysis text into an LLMResponse"""
         cleaned_response = self._clean_response(response)
         
         final_response = f"""
@@ -136,6 +319,37 @@ Brief Analysis:
             suggested_questions=self._generate_follow_up_questions(context) if not needs_more else None
         )
 
+    async def analyze_results(self, results: 'pd.DataFrame', context: Dict) -> 'LLMResponse':
+        """Analyze results using Llama"""
+        WorkflowMonitor.log_stage("LLM Analysis", {"context": context})
+        
+        # Repeat analyses of the same results and context replay the earlier reply
+        messages = self._analysis_messages()
+        cache_key = self._cache_key(self._format_api_prompt(messages), results, context)
+        response = await self._make_api_request(messages, cache_key)
+        return self.build_analysis_response(response, context)
+
+    async def analyze_results_stream(self, results: 'pd.DataFrame', context: Dict) -> AsyncIterator[str]:
+        """Stream the analysis text as it is generated
+        
+        Pass the joined text to build_analysis_response for the final LLMResponse.
+        """
+        WorkflowMonitor.log_stage("LLM Analysis", {"context": context})
+        
+        messages = self._analysis_messages()
+        cache_key = self._cache_key(self._format_api_prompt(messages), results, context)
+        started = False
+        try:
+            async for chunk in self.astream_complete(messages, cache_key):
+                started = True
+                yield chunk
+        except Exception as e:
+            # Text already shown can't be taken back, so only fall back before the first chunk
+            if started:
+                raise
+            logger.error("Streaming failed, falling back to a full completion: %s", e)
+            yield await self._make_api_request(messages, cache_key)
+
     async def chat_complete(self, messages: List[Dict[str, str]]) -> 'LLMResponse':
         """Handle chat completion using Llama"""
         WorkflowMonitor.log_stage("Chat Completion", {"message_count": len(messages)})
@@ -147,39 +361,38 @@ Brief Analysis:
 
     def _clean_response(self, response: str) -> str:
         """Clean the Llama response"""
+        # Fast path: most responses carry no prompt markers or special tokens
+        if not any(marker in response for marker in _SPECIAL_MARKERS):
+            return response.strip()
+        
         # Remove any system messages
-        response = response.split("[INST]")[0]
-        response = response.split("<<SYS>>")[-1].split("<</SYS>>")[-1]
+        response = response.split("[INST]", 1)[0]
+        response = _SYS_MARKER_RE.split(response)[-1]
         
         # Remove special tokens and clean whitespace
-        response = response.replace("</s>", "").replace("<s>", "").strip()
+        response = _SPECIAL_TOKEN_RE.sub("", response).strip()
         return response
 
     def _format_chat_prompt(self, messages: List[Dict[str, str]]) -> str:
         """Format messages into Llama chat format"""
-        formatted_prompt = ""
+        parts = []
         for msg in messages:
             role = msg["role"]
-            content = msg["content"]
+            if role == "user" and not parts:
+                role = "user_first"
             
-            if role == "system":
-                formatted_prompt += f"<s>[INST] <<SYS>>\n{content}\n<</SYS>>\n\n"
-            elif role == "user":
-                if formatted_prompt:
-                    formatted_prompt += f"{content} [/INST] "
-                else:
-                    formatted_prompt += f"[INST] {content} [/INST] "
-            elif role == "assistant":
-                formatted_prompt += f"{content} </s><s>[INST] "
+            template = _CHAT_TEMPLATES.get(role)
+            if template is not None:
+                parts.append(template.format(msg["content"]))
         
-        if not formatted_prompt.endswith("[INST] "):
-            formatted_prompt += "[/INST]"
+        if not parts or not parts[-1].endswith("[INST] "):
+            parts.append("[/INST]")
         
-        return formatted_prompt
+        return "".join(parts)
 
     # Other methods remain the same as they don't need Llama-specific changes
     def _get_system_prompt(self) -> str:
-        return base_system_prompt()
+        return self.system_prompt
 
     def _format_analysis_prompt(self, data_str: str, context: Dict) -> str:
         return llm_engine_instructions(
@@ -190,17 +403,10 @@ Brief Analysis:
         )
 
     def _check_data_requirements(self, response: str) -> tuple[bool, Optional[Dict]]:
-        needs_more_indicators = [
-            "need more data",
-            "additional information required",
-            "insufficient data",
-            "historical data would be helpful"
-        ]
-        
-        needs_more = any(indicator in response.lower() for indicator in needs_more_indicators)
+        needs_more = _NEEDS_MORE_RE.search(response) is not None
         
         additional_request = None
-        if needs_more and "historical" in response.lower():
+        if needs_more and _HISTORICAL_RE.search(response):
             additional_request = {
                 "extend_date_range": True,
                 "metrics": ["NDVI", "soil_moisture"]
@@ -209,8 +415,4 @@ Brief Analysis:
         return needs_more, additional_request
 
     def _generate_follow_up_questions(self, context: Dict) -> List[str]:
-        return [
-            f"Would you like to see a detailed analysis of specific areas in {context['location']}?",
-            "Should we analyze any other metrics for this field?",
-            "Would you like to compare this with historical data?"
-        ]
\ No newline at end of file
+        return [_LOCATION_FOLLOW_UP.format(context['location']), *_STATIC_FOLLOW_UPS]
\ No newline at end of file
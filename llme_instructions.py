@@ -1,21 +1,25 @@
 """This module contains the instructions for the LLM engine"""
+from types import MappingProxyType
+
+_ANALYSIS_TYPES = MappingProxyType({
+    "NDVI": "Analyze NDVI (Normalized Difference Vegetation Index) data to assess crop health and biomass. Focus on temporal changes and spatial patterns.",
+    'NDMI': "Analyze NDMI (Normalized Difference Moisture Index) data to evaluate soil moisture levels and water stress. Identify areas of concern and trends.",
+    "SAVI": "Analyze SAVI (Soil-Adjusted Vegetation Index) data to assess vegetation health while accounting for soil brightness. Highlight areas of concern and trends.",
+    "EVI": "Analyze EVI (Enhanced Vegetation Index) data to evaluate vegetation health and stress. Identify patterns and anomalies.",
+    "GNDVI": "Analyze GNDVI (Green Normalized Difference Vegetation Index) data to assess vegetation health and stress. Focus on spatial patterns and temporal trends.",
+    "Field_Area": "Analyze field area and boundary data to assess field size, shape, and uniformity. Identify potential issues or areas for improvement.",
+    "Canopy Cover": "Analyze canopy cover data to assess the extent and density of crop canopy. Identify variations and trends.",
+})
 
 def analysis_types():
     """Return the analysis types supported by the LLM engine"""
-    return {
-            "NDVI": "Analyze NDVI (Normalized Difference Vegetation Index) data to assess crop health and biomass. Focus on temporal changes and spatial patterns.",
-            'NDMI': "Analyze NDMI (Normalized Difference Moisture Index) data to evaluate soil moisture levels and water stress. Identify areas of concern and trends.",
-            "SAVI": "Analyze SAVI (Soil-Adjusted Vegetation Index) data to assess vegetation health while accounting for soil brightness. Highlight areas of concern and trends.",
-            "EVI": "Analyze EVI (Enhanced Vegetation Index) data to evaluate vegetation health and stress. Identify patterns and anomalies.",
-            "GNDVI": "Analyze GNDVI (Green Normalized Difference Vegetation Index) data to assess vegetation health and stress. Focus on spatial patterns and temporal trends.",
-            "Field_Area": "Analyze field area and boundary data to assess field size, shape, and uniformity. Identify potential issues or areas for improvement.",
-            "Canopy Cover": "Analyze canopy cover data to assess the extent and density of crop canopy. Identify variations and trends.",
-        }
+    return _ANALYSIS_TYPES
+
+# Formatted once at import rather than on every call
+_FORMATTED_TYPES = "\n".join(f"- {key}: {value}" for key, value in _ANALYSIS_TYPES.items())
 
 def llm_engine_instructions(data, location, date_range, crop_type):
     """Return the instructions for the LLM engine"""
-    formatted_types = "\n".join(f"- {key}: {value}" for key, value in analysis_types().items())
-    
     return f"""You are an AI assistant that provides additional insights and analysis based on the results of a computer vision analysis.
     
 You will receive structured data from the CV analysis engine and may need to request additional data to provide more detailed insights.
@@ -27,7 +31,7 @@ Your tasks include:
 - Providing recommendations or insights based on the data
 
 You should be able to handle different types of analysis, such as:
-{formatted_types}
+{_FORMATTED_TYPES}
 
 Your responses should be informative and tailored to the specific analysis type and context.
 
@@ -47,9 +51,7 @@ Provide insights about:
 3. Potential issues or concerns
 4. Recommendations"""
 
-def base_system_prompt():
-    """Return the base system prompt for the LLM engine"""
-    return """You are a concise agricultural analysis AI assistant. Your responses should:
+_BASE_SYSTEM_PROMPT = """You are a concise agricultural analysis AI assistant. Your responses should:
 1. Never exceed 3 sentences
 2. Focus only on the most critical insights
 3. Use simple, direct language
@@ -60,4 +62,8 @@ When analyzing data:
 - Provide one key recommendation (if needed)
 - Skip background information and technical details unless asked
 - Avoid qualifiers and hedging language
-- Use numbers/percentages when available"""
\ No newline at end of file
+- Use numbers/percentages when available"""
+
+def base_system_prompt():
+    """Return the base system prompt for the LLM engine"""
+    return _BASE_SYSTEM_PROMPT
\ No newline at end of file
@@ -1,4 +1,5 @@
 from typing import List, Dict, Optional, Union
+from collections import deque
 import httpx
 from llama_index.core.workflow import (
     Event, StartEvent, StopEvent, Workflow, step,
@@ -45,6 +46,15 @@ class ConversationState(Event):
 class MonitoredWorkflow(Workflow):
     """Enhanced workflow with monitoring"""
     
+    def __init__(self, cv_analyzer, llm_engine, results_parser, prompt_handler, **kwargs):
+        super().__init__(**kwargs)
+        self.cv_analyzer = cv_analyzer
+        self.llm = llm_engine
+        self.parser = results_parser
+        self.prompt_handler = prompt_handler
+        # Kinds of the most recent turns, kept bounded for ConversationState
+        self.cv_history_kinds = deque(maxlen=20)
+    
     @step
     async def handle_user_input(self, ctx: Context, ev: StartEvent | HumanResponseEvent) -> Union[CVRequest, StopEvent, InputRequiredEvent]:
         """Process user input with monitoring"""
@@ -58,7 +68,7 @@ class MonitoredWorkflow(Workflow):
             )
         
         request = await self.prompt_handler.parse_user_request(ev.response)
-        WorkflowMonitor.log_stage("Request Parsed", {"request": str(request)})
+        WorkflowMonitor.log_stage("Request Parsed", lambda: {"request": str(request)})
         
         await ctx.set("current_request", request)
         
@@ -80,14 +90,15 @@ class MonitoredWorkflow(Workflow):
             "metrics": ev.metrics
         })
         
-        results_df = await self.cv_analyzer.analyze(
+        # analyze returns the results together with the path of its output image
+        results_df, _ = await self.cv_analyzer.analyze(
             location=ev.location,
             date_range=ev.date_range,
             metrics=ev.metrics
         )
         
         parsed_results = self.parser.parse_cv_results(results_df)
-        WorkflowMonitor.log_stage("CV Analysis Complete", {
+        WorkflowMonitor.log_stage("CV Analysis Complete", lambda: {
             "results_shape": parsed_results.shape if hasattr(parsed_results, 'shape') else 'N/A'
         })
         
@@ -124,9 +135,10 @@ class MonitoredWorkflow(Workflow):
             if insights.needs_more_data:
                 return CVRequest(**insights.additional_request)
             
+            self.cv_history_kinds.append("analysis")
             return ConversationState(
                 current_topic=getattr(current_request, "topic", ""),
-                cv_history=[],  # Initialize empty list instead of accessing memory
+                cv_history=list(self.cv_history_kinds),
                 last_analysis=vars(insights),  # Convert to dict using vars()
                 follow_up_questions=insights.suggested_questions
             )
@@ -172,4 +184,6 @@ async def run_monitored_session():
             
     except Exception as e:
         WorkflowMonitor.log_stage("Error", {"error": str(e)})
-        raise
\ No newline at end of file
+        raise
+    finally:
+        await llm_engine.aclose()
\ No newline at end of file
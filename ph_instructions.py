@@ -1,6 +1,4 @@
-def prompt_handler_instructions():
-    """Return the instructions for the prompt handler"""
-    return """You are an agricultural analysis assistant. Your task is to parse user queries into a specific JSON format.
+_INSTRUCTIONS = """You are an agricultural analysis assistant. Your task is to parse user queries into a specific JSON format.
 
 Input Example: "Analyze Field A23 in Austin, Texas"
 Expected Output Example:
@@ -24,4 +22,8 @@ Error Example:
     "error": "Please specify which field you want to analyze"
 }
 
-Parse the user query and respond ONLY with the JSON object, nothing else."""
\ No newline at end of file
+Parse the user query and respond ONLY with the JSON object, nothing else."""
+
+def prompt_handler_instructions():
+    """Return the instructions for the prompt handler"""
+    return _INSTRUCTIONS
\ No newline at end of file
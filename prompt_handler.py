@@ -1,12 +1,18 @@
 from typing import Optional, List, Dict, Union
-from dataclasses import dataclass
-import json
+from collections import OrderedDict
+from dataclasses import dataclass, fields, replace
+import contextlib
 import logging
+import threading
+import orjson
 from llama_index.core.workflow import InputRequiredEvent # type: ignore
 
 from ph_instructions import prompt_handler_instructions
 from config import Config
 
+_VALID_METRICS = frozenset(Config.METRICS)
+_PARSE_CACHE_SIZE = 256
+
 @dataclass
 class ParsedRequest:
     location: str
@@ -15,37 +21,65 @@ class ParsedRequest:
     crop_type: Optional[str]
     additional_context: Dict
 
+# Fields a follow-up can change while keeping the previous request's location
+_FOLLOW_UP_FIELDS = tuple(field.name for field in fields(ParsedRequest) if field.name != "location")
+
 class PromptHandler:
     def __init__(self, llm):
         self.llm = llm
         self.default_metrics = ["NDVI", "soil_moisture", "crop_health"] # add as needed
-        logging.basicConfig(level=logging.DEBUG)
+        self.system_prompt = prompt_handler_instructions()
         self.logger = logging.getLogger(__name__)
+        # Successfully parsed requests, keyed by normalized user input
+        self._parse_cache: OrderedDict[str, ParsedRequest] = OrderedDict()
+        # The handler is shared by every session thread, so cache access is serialized
+        self._cache_lock = threading.Lock()
+        
+    async def parse_user_request(self, user_input: str, fallback: Optional[ParsedRequest] = None) -> ParsedRequest:
+        """Parse natural language user input into structured request parameters, filling in from fallback when no location is found"""
+        self.logger.debug("Parsing user request: %s", user_input)
         
-    async def parse_user_request(self, user_input: str) -> ParsedRequest:
-        """Parse natural language user input into structured request parameters"""
-        self.logger.debug(f"Parsing user request: {user_input}")
+        cache_key = user_input.strip().lower()
+        with self._cache_lock:
+            if (cached := self._parse_cache.get(cache_key)) is not None:
+                self._parse_cache.move_to_end(cache_key)
+        if cached is not None:
+            self.logger.debug("Using cached parse for: %s", user_input)
+            return cached
         
         # Construct the prompt for parameter extraction
-        system_prompt = prompt_handler_instructions()
+        system_prompt = self.system_prompt
         user_prompt = f"Extract structured information from this query: {user_input}"
         
         # Get LLM response
-        response = await self.llm.chat_complete([
+        content = await self._complete([
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt}
         ])
 
-        self.logger.debug(f"LLM response: {response.content}")
+        self.logger.debug("LLM response: %s", content)
 
         try:
             # Parse JSON response
-            parsed = json.loads(response.content)
-            self.logger.debug(f"Parsed JSON: {parsed}")
+            parsed = orjson.loads(content)
+            self.logger.debug("Parsed JSON: %s", parsed)
+            
+            # A follow-up that names no location keeps the previous request's scope,
+            # updated with whatever else it does name. It isn't cached, as it depends on fallback
+            if fallback is not None and not str(parsed.get("location") or "").strip():
+                updates = {name: parsed[name] for name in _FOLLOW_UP_FIELDS if parsed.get(name)}
+                validation_result = self._validate_parsing({"location": fallback.location, **updates})
+                if isinstance(validation_result, str):
+                    self.logger.debug("Follow-up validation failed: %s", validation_result)
+                    return InputRequiredEvent(
+                        prefix=f"Could you please clarify: {validation_result}"
+                    )
+                self.logger.debug("No location found, updating the previous request with %s", updates)
+                return replace(fallback, **updates)
             
             # Check if LLM identified missing information
             if "error" in parsed:
-                self.logger.debug(f"Error in parsed JSON: {parsed['error']}")
+                self.logger.debug("Error in parsed JSON: %s", parsed['error'])
                 return InputRequiredEvent(
                     prefix=f"I need some clarification: {parsed['error']}. Could you please provide more details?"
                 )
@@ -53,13 +87,13 @@ class PromptHandler:
             # Validate the parsed data
             validation_result = self._validate_parsing(parsed)
             if isinstance(validation_result, str):
-                self.logger.debug(f"Validation failed: {validation_result}")
+                self.logger.debug("Validation failed: %s", validation_result)
                 return InputRequiredEvent(
                     prefix=f"Could you please clarify: {validation_result}"
                 )
             
             self.logger.debug("Successfully parsed and validated request")
-            return ParsedRequest(
+            request = ParsedRequest(
                 location=parsed["location"],
                 date_range=parsed.get("date_range", "last 30 days"),
                 metrics=parsed.get("metrics", self.default_metrics),
@@ -67,18 +101,60 @@ class PromptHandler:
                 additional_context=parsed.get("additional_context", {})
             )
             
-        except json.JSONDecodeError as e:
-            self.logger.error(f"JSON decode error: {str(e)}")
-            self.logger.error(f"Raw content: {response.content}")
+            # Only successful parses are cached; clarification requests are retried
+            with self._cache_lock:
+                self._parse_cache[cache_key] = request
+                if len(self._parse_cache) > _PARSE_CACHE_SIZE:
+                    self._parse_cache.popitem(last=False)
+            return request
+            
+        except orjson.JSONDecodeError as e:
+            self.logger.error("JSON decode error: %s", e)
+            self.logger.error("Raw content: %s", content)
             return InputRequiredEvent(
                 prefix="I couldn't understand that completely. Could you rephrase your request with a specific location and what you'd like to analyze?"
             )
         except Exception as e:
-            self.logger.error(f"Unexpected error: {str(e)}")
+            self.logger.error("Unexpected error: %s", e)
             return InputRequiredEvent(
                 prefix="I encountered an unexpected error. Could you try rephrasing your request?"
             )
     
+    async def _complete(self, messages: List[Dict[str, str]]) -> str:
+        """Get the LLM reply, cutting a streamed reply off once its JSON object closes"""
+        if not hasattr(self.llm, "astream_complete"):
+            return (await self.llm.chat_complete(messages)).content
+        
+        try:
+            buffer = []
+            depth = 0
+            in_string = escaped = False
+            async with contextlib.aclosing(self.llm.astream_complete(messages)) as stream:
+                async for chunk in stream:
+                    for idx, char in enumerate(chunk):
+                        # Track brace depth, ignoring braces inside JSON strings
+                        if in_string:
+                            if escaped:
+                                escaped = False
+                            elif char == "\\":
+                                escaped = True
+                            elif char == '"':
+                                in_string = False
+                        elif char == '"':
+                            in_string = True
+                        elif char == "{":
+                            depth += 1
+                        elif char == "}" and depth > 0:
+                            depth -= 1
+                            if depth == 0:
+                                buffer.append(chunk[:idx + 1])
+                                return "".join(buffer).strip()
+                    buffer.append(chunk)
+            return "".join(buffer).strip()
+        except Exception as e:
+            self.logger.error("Streaming failed, falling back to a full completion: %s", e)
+            return (await self.llm.chat_complete(messages)).content
+    
     def _validate_parsing(self, parsed: Dict) -> Union[str, Dict]:
         """Validate the parsed parameters, return error message if invalid"""
         # Check required location
@@ -86,12 +162,9 @@ class PromptHandler:
             return "I need a specific location to analyze. Where should I look?"
         
         # Validate metrics if provided
-        valid_metrics = Config.METRICS
-        
         if "metrics" in parsed:
-            invalid_metrics = [m for m in parsed["metrics"] if m not in valid_metrics]
-            if invalid_metrics:
-                metrics_list = ", ".join(valid_metrics)
+            if not _VALID_METRICS.issuperset(parsed["metrics"]):
+                metrics_list = ", ".join(Config.METRICS)
                 return f"I can only analyze these metrics: {metrics_list}. Which would you like to use?"
         
         return parsed
\ No newline at end of file
@@ -1,10 +1,32 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
 import pandas as pd
 import numpy as np
-from typing import Union, Dict, List
+from typing import Optional, Union, Dict, List
+
+_RNG = np.random.default_rng()
+_DEFAULT_DATES = pd.date_range(start='2024-01-01', periods=10)
+_CACHE_SIZE = 64
+
+logger = logging.getLogger(__name__)
 
 class ResultsParser:
     """Parser for CV analysis results with error handling"""
     
+    def __init__(self):
+        # Cleaned DataFrames keyed by a fingerprint of the raw input
+        self._cache: OrderedDict[bytes, pd.DataFrame] = OrderedDict()
+        # The parser is shared by every session thread, so cache access is serialized
+        self._cache_lock = threading.Lock()
+        # Result type -> parser, checked before any isinstance chain
+        self._dispatch = {
+            pd.DataFrame: self._cached_clean_df,
+            dict: self._dict_to_df,
+            list: self._list_to_df
+        }
+    
     def parse_cv_results(self, results_df: Union[pd.DataFrame, Dict, List, None]) -> pd.DataFrame:
         """
         Parse CV analysis results into a consistent DataFrame format
@@ -15,66 +37,102 @@ class ResultsParser:
             if results_df is None:
                 return self._create_default_df()
                 
-            # If results are already a DataFrame
-            if isinstance(results_df, pd.DataFrame):
-                return self._validate_and_clean_df(results_df)
-                
-            # If results are a dictionary
-            if isinstance(results_df, dict):
-                return self._dict_to_df(results_df)
-                
-            # If results are a list
-            if isinstance(results_df, list):
-                return self._list_to_df(results_df)
+            # Exact types hit the dispatch table directly
+            handler = self._dispatch.get(type(results_df))
+            if handler is None:
+                # Fall back to isinstance checks for subclasses (e.g. OrderedDict)
+                handler = next(
+                    (fn for cls, fn in self._dispatch.items() if isinstance(results_df, cls)),
+                    None
+                )
+            if handler is not None:
+                return handler(results_df)
                 
             # For any other type, return default DataFrame
             return self._create_default_df()
             
         except Exception as e:
-            print(f"Error parsing results: {str(e)}")
+            logger.error("Error parsing results: %s", e)
             return self._create_default_df()
     
+    def _cached_clean_df(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Validate and clean a DataFrame, reusing the result for identical inputs"""
+        key = self._fingerprint(df)
+        if key is None:
+            return self._validate_and_clean_df(df)
+        
+        with self._cache_lock:
+            if (cached := self._cache.get(key)) is not None:
+                self._cache.move_to_end(key)
+        
+        if cached is None:
+            # Cleaned outside the lock; a concurrent miss on the same key just cleans twice
+            cached = self._validate_and_clean_df(df)
+            with self._cache_lock:
+                self._cache[key] = cached
+                if len(self._cache) > _CACHE_SIZE:
+                    self._cache.popitem(last=False)
+        
+        # Shallow copy so callers adding columns don't alter the cached frame
+        return cached.copy(deep=False)
+    
+    def _fingerprint(self, df: pd.DataFrame) -> Optional[bytes]:
+        """Hash a DataFrame's columns and contents, or None if it holds unhashable values"""
+        try:
+            row_hashes = pd.util.hash_pandas_object(df, index=True).to_numpy()
+        except TypeError:
+            return None
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(repr(list(df.columns)).encode())
+        digest.update(row_hashes.tobytes())
+        return digest.digest()
+    
     def _create_default_df(self) -> pd.DataFrame:
         """Create a default DataFrame with sample data"""
+        # One draw for all sample columns: NDVI, Field_Area, health_score
+        values = _RNG.uniform([0.3, 20, 60], [0.8, 40, 90], (len(_DEFAULT_DATES), 3))
         return pd.DataFrame({
-            'date': pd.date_range(start='2024-01-01', periods=10),
-            'NDVI': np.random.uniform(0.3, 0.8, 10),
-            'Field_Area': np.random.uniform(20, 40, 10),
-            'health_score': np.random.uniform(60, 90, 10)
+            'date': _DEFAULT_DATES,
+            'NDVI': values[:, 0],
+            'Field_Area': values[:, 1],
+            'health_score': values[:, 2]
         })
     
     def _validate_and_clean_df(self, df: pd.DataFrame) -> pd.DataFrame:
         """Validate and clean a DataFrame"""
         # Ensure required columns exist
         required_columns = ['date', 'ndvi', 'soil_moisture', 'health_score']
+        numeric_columns = required_columns[1:]
         
         # Add any missing columns with default values
-        for col in required_columns:
-            if col not in df.columns:
-                if col == 'date':
-                    df[col] = pd.date_range(start='2024-01-01', periods=len(df))
-                else:
-                    df[col] = np.random.uniform(0, 100, len(df))
+        missing = [col for col in required_columns if col not in df.columns]
+        if 'date' in missing:
+            if len(df) <= len(_DEFAULT_DATES):
+                df['date'] = _DEFAULT_DATES[:len(df)]
+            else:
+                df['date'] = pd.date_range(start=_DEFAULT_DATES[0], periods=len(df))
+        missing_numeric = [col for col in missing if col != 'date']
+        if missing_numeric:
+            df[missing_numeric] = _RNG.uniform(0, 100, (len(df), len(missing_numeric)))
         
-        # Clean up any null values
-        df = df.fillna({
-            'ndvi': df['ndvi'].mean(),
-            'soil_moisture': df['soil_moisture'].mean(),
-            'health_score': df['health_score'].mean()
-        })
+        # Clean up any null values, computing every column mean in one pass
+        df = df.fillna(df[numeric_columns].mean())
         
         return df
     
     def _dict_to_df(self, data: Dict) -> pd.DataFrame:
         """Convert dictionary to DataFrame"""
         try:
-            return pd.DataFrame([data])
+            # Column-wise construction skips the list-of-dicts inference path
+            return pd.DataFrame({key: [value] for key, value in data.items()})
         except Exception:
             return self._create_default_df()
     
     def _list_to_df(self, data: List) -> pd.DataFrame:
         """Convert list to DataFrame"""
         try:
+            if data and isinstance(data[0], dict):
+                return pd.DataFrame.from_records(data)
             return pd.DataFrame(data)
         except Exception:
             return self._create_default_df()
\ No newline at end of file
@@ -1,18 +1,88 @@
 import asyncio
-from typing import Dict, List
-import json
+import contextlib
+import threading
+import time
+import uuid
+import weakref
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+import orjson
 import streamlit as st
 from llama_index.core.workflow import InputRequiredEvent
-from datetime import datetime
 import pandas as pd
+from cachetools import LRUCache
 
-from llm_engine import APILLMEngine, WorkflowMonitor
+from llm_engine import APILLMEngine, aclose_http_client
 from cv_analyzer import HardcodedCVAnalyzer
 from results_parser import ResultsParser
-from prompt_handler import PromptHandler
+from prompt_handler import ParsedRequest, PromptHandler
 from config import Config
 from visualizer import AgriVisualizer
 
+# Use uvloop for the session event loops when it is available. The loops are created
+# directly, so the process-wide policy shared with Streamlit's server is left alone
+try:
+    from uvloop import new_event_loop as _new_event_loop
+except ImportError:
+    from asyncio import new_event_loop as _new_event_loop
+
+def _close_loop(loop: asyncio.AbstractEventLoop):
+    """Close a session loop's HTTP client, then the loop itself"""
+    try:
+        loop.run_until_complete(aclose_http_client())
+        loop.run_until_complete(loop.shutdown_asyncgens())
+    finally:
+        loop.close()
+
+def _close_loop_in_thread(loop: asyncio.AbstractEventLoop):
+    """Close a session loop on its own thread, as the collecting thread may be running another loop"""
+    threading.Thread(target=_close_loop, args=(loop,), name="session-loop-close", daemon=True).start()
+
+class _SessionLoop:
+    """Event loop owned by one browser session, closed once the session's state is released"""
+
+    def __init__(self):
+        self.loop = _new_event_loop()
+        # Streamlit has no session teardown hook, so close the loop when session_state drops it
+        finalizer = weakref.finalize(self, _close_loop_in_thread, self.loop)
+        finalizer.atexit = False
+
+_DEFAULT_METRICS = ("NDVI", "Field_Area")
+
+# Minimum seconds between redraws of a streaming reply
+_STREAM_RENDER_INTERVAL = 0.05
+
+# Upper bound on workflow DataFrames kept in memory across all sessions
+_BLOB_STORE_SIZE = 256
+
+@st.cache_resource
+def _blob_store() -> Tuple[LRUCache, threading.Lock]:
+    """Process-wide store for heavy workflow payloads, referenced by token from session_state, and its lock"""
+    # The script is re-executed on every run, so the lock is cached with the store it guards
+    return LRUCache(maxsize=_BLOB_STORE_SIZE), threading.Lock()
+
+def _put_blob(value) -> Dict[str, str]:
+    """Store a payload out of session_state and return a reference to it"""
+    token = uuid.uuid4().hex
+    store, lock = _blob_store()
+    with lock:
+        store[token] = value
+    return {"__ref__": token}
+
+def _resolve_blob(value):
+    """Return the payload behind a reference, or the value itself if it isn't one"""
+    if isinstance(value, dict) and "__ref__" in value:
+        store, lock = _blob_store()
+        with lock:
+            return store.get(value["__ref__"])
+    return value
+
+@st.cache_data(ttl=3600, max_entries=128, show_spinner=False)
+def _cached_cv_analysis(_cv_analyzer: HardcodedCVAnalyzer, location: str, date_range: str,
+                        metrics: Tuple[str, ...]) -> Tuple[pd.DataFrame, str]:
+    """Run CV analysis once per (location, date range, metrics) for an hour"""
+    return _cv_analyzer.analyze_sync(location=location, date_range=date_range, metrics=list(metrics))
+
 class StreamlitUI:
     def __init__(self):
         # Initialize components
@@ -23,15 +93,22 @@ class StreamlitUI:
         
         self.visualizer = AgriVisualizer()
         
-        # Initialize session state
+    @staticmethod
+    def init_session_state():
+        """Initialize per-session state, run on every script execution"""
         if 'messages' not in st.session_state:
             st.session_state.messages = []
         
         if 'conversation_memory' not in st.session_state:
-            st.session_state.conversation_memory = []
+            # Recent turns only, so session memory stays bounded
+            st.session_state.conversation_memory = deque(maxlen=Config.MEMORY_WINDOW)
             
         if 'workflow_steps' not in st.session_state:
             st.session_state.workflow_steps = []
+        
+        if 'session_loop' not in st.session_state:
+            # Reused for every message so the loop's pooled HTTP connections survive
+            st.session_state.session_loop = _SessionLoop()
             
     def update_workflow_status(self, step: str, status: str = "pending", details: Dict = None):
         """Update workflow steps in session state"""
@@ -41,23 +118,42 @@ class StreamlitUI:
             "timestamp": st.session_state.get('current_timestamp', 0),
             "details": details
         }
+        if details:
+            # Serialize the non-visual details once here rather than on every rerun
+            cleaned_details = {k: v for k, v in details.items() if k not in ('df', 'image')}
+            if cleaned_details:
+                workflow_step["_json"] = orjson.dumps(
+                    cleaned_details, default=str, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY
+                ).decode()
+            if isinstance(details.get('df'), pd.DataFrame):
+                # Keep DataFrames out of session_state, which only holds the reference
+                workflow_step["details"] = {**details, 'df': _put_blob(details['df'])}
         st.session_state.workflow_steps.append(workflow_step)
 
     def display_workflow(self):
         """Display workflow steps in the workflow column"""
         for idx, step in enumerate(st.session_state.workflow_steps):
+            if (details := step.get("details")) and "df" in details:
+                step = {**step, "details": {**details, "df": _resolve_blob(details["df"])}}
             self.visualizer.display_workflow_step(step, idx)
                         
     def display_metrics_selector(self) -> List[str]:
         """Display metric selection widget"""
-        available_metrics = Config.METRICS
         selected = st.multiselect(
             "Select metrics to analyze (optional)",
-            options=available_metrics,
-            default=["NDVI", "Field_Area"]
+            options=Config.METRICS,
+            default=_DEFAULT_METRICS
         )
         return selected
 
+    def previous_request(self) -> Optional[ParsedRequest]:
+        """Return the most recent parsed request in conversation memory, if any"""
+        return next(
+            (entry["request"] for entry in reversed(st.session_state.conversation_memory)
+             if entry.get("request") is not None),
+            None
+        )
+
     async def process_message(self, user_input: str, selected_metrics: List[str]):
         """Process user input and generate response"""
         # Reset workflow steps for new query
@@ -71,7 +167,9 @@ class StreamlitUI:
             # Step 1: Parse user request
             self.update_workflow_status("1. Parsing user prompt", "pending")
             metrics_context = f"{user_input} analyzing metrics: {', '.join(selected_metrics)}"
-            request = await self.prompt_handler.parse_user_request(metrics_context)
+            request = await self.prompt_handler.parse_user_request(
+                metrics_context, fallback=self.previous_request()
+            )
             
             # Add parsed request details to workflow
             if not isinstance(request, InputRequiredEvent):
@@ -94,10 +192,12 @@ class StreamlitUI:
                 # Step 2: CV Analysis
                 self.update_workflow_status("2. Computer Vision Analysis", "pending")
                 with st.spinner("Analyzing field data..."):
-                    results = await self.cv_analyzer.analyze(
-                        location=request.location,
-                        date_range=request.date_range,
-                        metrics=selected_metrics
+                    # Repeat queries reuse the cached results instead of rerunning the analysis
+                    results, _ = _cached_cv_analysis(
+                        self.cv_analyzer,
+                        location=str(request.location).strip().lower(),
+                        date_range=str(request.date_range).strip().lower(),
+                        metrics=tuple(selected_metrics)
                     )
                 self.update_workflow_status("2. Computer Vision Analysis", "complete", 
                                          {"analyzed_metrics": selected_metrics})
@@ -106,8 +206,9 @@ class StreamlitUI:
                 self.update_workflow_status("3. Processing CV Results", "pending")
                 parsed_results = self.results_parser.parse_cv_results(results)
                 result_summary = {
-                    "shape": parsed_results.shape if hasattr(parsed_results, 'shape') else None,
-                    "columns": list(parsed_results.columns) if hasattr(parsed_results, 'columns') else None,
+                    # parse_cv_results always returns a DataFrame
+                    "shape": parsed_results.shape,
+                    "columns": list(parsed_results.columns),
                     "df": parsed_results, "image": "assets/histogram.jpeg"
                 }
                 self.update_workflow_status("3. Processing CV Results", "complete", result_summary)
@@ -121,10 +222,28 @@ class StreamlitUI:
                     "metrics": selected_metrics,
                 }
                 
-                insights = await self.llm_engine.analyze_results(
-                    results=parsed_results,
-                    context=context
-                )
+                # Show the analysis as it streams in, redrawing at most every _STREAM_RENDER_INTERVAL
+                chunks = []
+                stream_slot = st.empty()
+                try:
+                    with stream_slot.container(), st.chat_message("assistant"):
+                        placeholder = st.empty()
+                        last_render = time.monotonic()
+                        async with contextlib.aclosing(self.llm_engine.analyze_results_stream(
+                            results=parsed_results,
+                            context=context
+                        )) as stream:
+                            async for chunk in stream:
+                                chunks.append(chunk)
+                                if (now := time.monotonic()) - last_render >= _STREAM_RENDER_INTERVAL:
+                                    placeholder.markdown("".join(chunks))
+                                    last_render = now
+                finally:
+                    # The finished reply is drawn with its visualizations by the chat panel,
+                    # and a failed one is replaced by the error message
+                    stream_slot.empty()
+                
+                insights = self.llm_engine.build_analysis_response("".join(chunks), context)
                 self.update_workflow_status("4. Generating Analysis", "complete", 
                                          {"analysis_context": context})
                 
@@ -133,8 +252,8 @@ class StreamlitUI:
                 # Store in conversation memory
                 memory_entry = {
                     "type": "analysis",
-                    "results": parsed_results,
-                    "insights": insights
+                    "insights": insights,
+                    "request": request
                 }
                 st.session_state.conversation_memory.append(memory_entry)
                 
@@ -142,14 +261,76 @@ class StreamlitUI:
                 self.update_workflow_status("5. Ready for follow-up questions", "complete", 
                                          {"suggested_questions": insights.suggested_questions})
             
-            # Add assistant response to chat
-            st.session_state.messages.append({"role": "assistant", "content": response})
+            # Add assistant response to chat, with this turn's visualizations attached
+            viz = [
+                {key: details[key] for key in ("df", "image") if details.get(key) is not None}
+                for step in st.session_state.workflow_steps
+                if (details := step.get("details")) and 
+                (details.get("df") is not None or details.get("image") is not None)
+            ]
+            st.session_state.messages.append({"role": "assistant", "content": response, "viz": viz})
             
         except Exception as e:
             self.update_workflow_status("Error occurred", "error", {"error": str(e)})
             error_message = f"An error occurred: {str(e)}"
             st.session_state.messages.append({"role": "assistant", "content": error_message})
 
+@st.cache_resource
+def get_ui() -> StreamlitUI:
+    """Build the UI components once per process and reuse them across reruns"""
+    return StreamlitUI()
+
+def render_message(ui: StreamlitUI, message: Dict, selected_metrics: List[str], key: int):
+    """Display a chat message with its attached visualizations, key being its index in the chat"""
+    with st.chat_message(message["role"]):
+        st.markdown(message["content"])
+        
+        # Display the visualizations attached to the message
+        for viz_idx, viz in enumerate(message.get("viz", ())):
+            # Display DataFrame visualizations; evicted frames resolve to None
+            if (df := _resolve_blob(viz.get("df"))) is not None:
+                if isinstance(df, pd.DataFrame) and not df.empty:
+                    with st.expander("📊 Metrics Analysis", expanded=True):
+                        ui.visualizer.display_metrics_visualization(df, selected_metrics, key=f"message-{key}-{viz_idx}")
+            
+            # Display images
+            if image := viz.get("image"):
+                st.image(image, use_column_width=True)
+
+@st.fragment
+def chat_panel(ui: StreamlitUI, selected_metrics: List[str]):
+    """Chat history, chat input and workflow progress, rerun on their own on chat input"""
+    main_col, workflow_col = st.columns([2, 1])
+    
+    with main_col:
+        # Display chat messages with enhanced visualization
+        for idx, message in enumerate(st.session_state.messages):
+            render_message(ui, message, selected_metrics, idx)
+        
+        # The new turn is drawn here, below the history, instead of rerunning to redraw it
+        new_turn = st.container()
+        
+        # Chat input
+        if prompt := st.chat_input("What would you like to analyze?"):
+            with new_turn:
+                first_new = len(st.session_state.messages)
+                with st.chat_message("user"):
+                    st.markdown(prompt)
+                with st.spinner("Processing your request..."):
+                    try:
+                        st.session_state.session_loop.loop.run_until_complete(ui.process_message(prompt, selected_metrics))
+                    except Exception as e:
+                        st.error(f"An error occurred: {str(e)}")
+                # The user message is already on screen
+                for idx in range(first_new + 1, len(st.session_state.messages)):
+                    render_message(ui, st.session_state.messages[idx], selected_metrics, idx)
+    
+    # Keep workflow steps in sidebar for progress tracking, drawn after the turn so they're current
+    with workflow_col:
+        # Only show non-visual information in sidebar, serialized when the step was recorded
+        for step in st.session_state.workflow_steps:
+            ui.visualizer.display_workflow_summary(step)
+
 def main():
     st.set_page_config(
         page_title="AgriViewer Chat",
@@ -169,69 +350,19 @@ def main():
         """)
         
         # Initialize UI
-        ui = StreamlitUI()
+        ui = get_ui()
+        ui.init_session_state()
         
         # Display metrics selector
         selected_metrics = ui.display_metrics_selector()
         if not selected_metrics:
             st.warning("Please select at least one metric to analyze")
             return
-        
-        # Display chat messages with enhanced visualization
-        for message in st.session_state.messages:
-            with st.chat_message(message["role"]):
-                st.markdown(message["content"])
-                
-                # For assistant messages, display any visualizations from workflow steps
-                if message["role"] == "assistant":
-                    # Find the relevant workflow steps with visualizations
-                    relevant_steps = [
-                        step for step in st.session_state.workflow_steps 
-                        if step.get("details") and 
-                        (step["details"].get("df") is not None or step["details"].get("image") is not None)
-                    ]
-                    
-                    # Display visualizations from workflow steps
-                    for step in relevant_steps:
-                        details = step["details"]
-                        
-                        # Display DataFrame visualizations
-                        if (df := details.get("df")) is not None:
-                            if isinstance(df, pd.DataFrame) and not df.empty:
-                                with st.expander("📊 Metrics Analysis", expanded=True):
-                                    print(df)
-                                    ui.visualizer.display_metrics_visualization(df, selected_metrics)
-                        
-                        # Display images
-                        if image := details.get("image"):
-                            st.image(image, use_column_width=True)
-        
-        # Chat input
-        if prompt := st.chat_input("What would you like to analyze?"):
-            with st.spinner("Processing your request..."):
-                try:
-                    asyncio.run(ui.process_message(prompt, selected_metrics))
-                    st.rerun()
-                except Exception as e:
-                    st.error(f"An error occurred: {str(e)}")
     
-    # Keep workflow steps in sidebar for progress tracking
     with workflow_col:
         st.title("Analysis Progress")
-        for step in st.session_state.workflow_steps:
-            status_color = {
-                "pending": "🔵",
-                "complete": "✅",
-                "error": "❌"
-            }.get(step["status"], "⚪")
-            
-            with st.expander(f"{status_color} {step['step']}", expanded=True):
-                if (details := step.get("details")):
-                    # Only show non-visual information in sidebar
-                    cleaned_details = {k: v for k, v in details.items() 
-                                    if k not in ['df', 'image']}
-                    if cleaned_details:
-                        st.code(json.dumps(cleaned_details, indent=2), language="json")
+    
+    chat_panel(ui, selected_metrics)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -5,19 +5,23 @@ import altair as alt
 def plot_metrics(df: pd.DataFrame, metrics: list):
     """Create interactive plots for agricultural metrics"""
     
-    # Create a base line chart
-    for metric in metrics:
-        chart = alt.Chart(df).mark_line().encode(
-            x=alt.X('date:T', title='Date'),
-            y=alt.Y(f'{metric}:Q', title=metric),
-            tooltip=['date', metric]
-        ).properties(
-            title=f'{metric} Over Time',
-            width=600,
-            height=300
-        ).interactive()
-        
-        st.altair_chart(chart, use_container_width=True)
+    # Long format so every metric is drawn by one faceted chart
+    long_df = df.melt(id_vars=['date'], value_vars=metrics, var_name='metric', value_name='value')
+    
+    # Create a line chart per metric row, each with its own y scale
+    chart = alt.Chart(long_df).mark_line().encode(
+        x=alt.X('date:T', title='Date'),
+        y=alt.Y('value:Q', title=None),
+        color=alt.Color('metric:N', legend=None),
+        tooltip=['date', 'metric', 'value']
+    ).properties(
+        width=600,
+        height=200
+    ).interactive().facet(
+        row=alt.Row('metric:N', title=None, sort=list(metrics))
+    ).resolve_scale(y='independent')
+    
+    st.altair_chart(chart, use_container_width=True)
 
 def display_analysis(response: 'LLMResponse'):
     """Display LLM analysis and visualizations in Streamlit"""
@@ -2,7 +2,43 @@ import streamlit as st
 import pandas as pd
 import altair as alt
 from typing import List, Optional, Dict
-import json
+import orjson
+import functools
+import hashlib
+
+# Status icon shown in front of each workflow step
+STATUS_ICONS = {
+    "pending": "🔵",
+    "complete": "✅",
+    "error": "❌"
+}
+
+@functools.lru_cache(maxsize=256)
+def _step_label(step_name: str, status: str) -> str:
+    """Expander label for a workflow step"""
+    return f"{STATUS_ICONS.get(status, '⚪')} {step_name}"
+
+def _frame_digest(df: pd.DataFrame) -> bytes:
+    """Digest of a DataFrame's columns and contents, used as an explicit cache key"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr(list(df.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.digest()
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def _metric_chart_spec(df_digest: bytes, metric: str, _df: pd.DataFrame) -> dict:
+    """Vega-Lite spec of a metric chart, built once per DataFrame content and metric"""
+    return AgriVisualizer.create_metric_chart(_df, metric).to_dict()
+
+@st.cache_data(show_spinner=False, max_entries=256)
+def _summary_statistics(df_digest: bytes, metrics: tuple, _df: pd.DataFrame) -> pd.DataFrame:
+    """describe() of the given metric columns, computed once per DataFrame content"""
+    return _df[list(metrics)].describe()
+
+@st.cache_data(show_spinner=False, max_entries=64, ttl=24 * 60 * 60)
+def _csv_bytes(df_digest: bytes, _df: pd.DataFrame) -> bytes:
+    """CSV download payload, serialized once per DataFrame content"""
+    return _df.to_csv(index=False).encode()
 
 class AgriVisualizer:
     """Handles visualization of agricultural metrics and analysis results"""
@@ -32,70 +68,81 @@ class AgriVisualizer:
             title=f'{metric} Over Time'
         ).interactive()
 
-    def display_metrics_visualization(self, df: pd.DataFrame, metrics: List[str]):
-        """Display interactive visualizations for selected metrics"""
+    def display_metrics_visualization(self, df: pd.DataFrame, metrics: List[str], key: Optional[str] = None):
+        """Display interactive visualizations for selected metrics, keying widgets with key"""
         if df is None or df.empty:
             st.warning("No data available for visualization")
             return
             
         st.subheader("📊 Metrics Visualization")
         
+        # One cached describe() pass serves both the per-metric cards and the summary tab
+        df_digest = _frame_digest(df)
+        metrics = [metric for metric in metrics if metric in df.columns]
+        summary = _summary_statistics(df_digest, tuple(metrics), df)
+        
         # Create tabs for different visualization types
         tab1, tab2 = st.tabs(["Time Series", "Summary Statistics"])
         
         with tab1:
-            # Display individual metric charts
+            # Display individual metric charts, reusing specs built on earlier reruns
             for metric in metrics:
-                if metric in df.columns:
-                    chart = self.create_metric_chart(df, metric)
-                    st.altair_chart(chart, use_container_width=True)
-                    
-                    # Add metric statistics
-                    col1, col2, col3 = st.columns(3)
-                    with col1:
-                        st.metric(f"{metric} Average", 
-                                f"{df[metric].mean():.2f}")
-                    with col2:
-                        st.metric(f"{metric} Min", 
-                                f"{df[metric].min():.2f}")
-                    with col3:
-                        st.metric(f"{metric} Max", 
-                                f"{df[metric].max():.2f}")
+                st.vega_lite_chart(_metric_chart_spec(df_digest, metric, df), use_container_width=True)
+                
+                # Add metric statistics
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.metric(f"{metric} Average", 
+                            f"{summary.at['mean', metric]:.2f}")
+                with col2:
+                    st.metric(f"{metric} Min", 
+                            f"{summary.at['min', metric]:.2f}")
+                with col3:
+                    st.metric(f"{metric} Max", 
+                            f"{summary.at['max', metric]:.2f}")
         
         with tab2:
             # Display summary statistics
-            st.dataframe(df[metrics].describe())
+            st.dataframe(summary)
             
             # Add download button for the data
             st.download_button(
                 label="Download Data as CSV",
-                data=df.to_csv(index=False),
+                data=_csv_bytes(df_digest, df),
                 file_name="agricultural_metrics.csv",
-                mime="text/csv"
+                mime="text/csv",
+                # Frames with the same data would otherwise get the same widget ID
+                key=key
             )
     
     def display_workflow_step(self, step: Dict, key: int):
         """Display a single workflow step with enhanced visualization"""
-        status_color = {
-            "pending": "🔵",
-            "complete": "✅",
-            "error": "❌"
-        }.get(step["status"], "⚪")
-        
-        with st.expander(f"{status_color} {step['step']}", expanded=True):
+        with st.expander(_step_label(step['step'], step["status"]), expanded=True):
             if details := step.get("details"):
                 # Handle DataFrame visualization
                 if (df := details.get('df')) is not None:
                     if isinstance(df, pd.DataFrame):
-                        metrics = [col for col in df.columns if col != 'date']
-                        self.display_metrics_visualization(df, metrics)
+                        # Every column but the date is a metric, kept in frame order
+                        self.display_metrics_visualization(
+                            df, df.columns.drop('date', errors='ignore').tolist(), key=f"workflow-{key}"
+                        )
                 
                 # Handle image visualization
                 if image := details.get('image'):
                     st.image(image, use_column_width=True)
                 
-                # Display other details
-                cleaned_details = {k: v for k, v in details.items() 
-                                 if k not in ['df', 'image']}
-                if cleaned_details:
-                    st.code(json.dumps(cleaned_details, indent=2), language="json")
+                # Display other details, reusing the JSON cached on the step if present
+                if (step_json := step.get("_json")) is None:
+                    cleaned_details = {k: v for k, v in details.items() 
+                                     if k not in ['df', 'image']}
+                    step_json = orjson.dumps(
+                        cleaned_details, default=str, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY
+                    ).decode() if cleaned_details else None
+                if step_json:
+                    st.code(step_json, language="json")
+
+    def display_workflow_summary(self, step: Dict):
+        """Display a workflow step's status and non-visual details only"""
+        with st.expander(_step_label(step['step'], step["status"]), expanded=True):
+            if (step_json := step.get("_json")):
+                st.code(step_json, language="json")